@@ -0,0 +1,17 @@
+"""
+_compat.py
+Detection of optional accelerator dependencies.
+"""
+try:
+    import numba
+    HAS_NUMBA = True
+except ImportError:
+    numba = None
+    HAS_NUMBA = False
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
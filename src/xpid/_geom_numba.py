@@ -0,0 +1,75 @@
+"""
+_geom_numba.py
+Fused per-(X, H) geometry kernel, JIT-compiled with numba when it is installed.
+Undefined results are flagged with -1.0 so the kernel stays numba-typable.
+The kernel lives in this file with the cached pair loops that inline it: numba
+invalidates cached code only when the compiled function's own file changes.
+"""
+import math
+import numpy as np
+from ._compat import HAS_NUMBA, numba
+
+prange = numba.prange if HAS_NUMBA else range
+
+def _interaction_geometry_impl(pi_center, pi_normal, x_pos, h_pos):
+    """All per-(X, H) metrics in one pass: (xpcn, xh_pi, theta, proj_dist). pi_normal is unit length."""
+    nx, ny, nz = pi_normal[0], pi_normal[1], pi_normal[2]
+    
+    # Angles use |dot| / sqrt(a2 * b2): one sqrt and one divide per norm ratio
+    
+    # X -> PiCenter
+    vx, vy, vz = pi_center[0] - x_pos[0], pi_center[1] - x_pos[1], pi_center[2] - x_pos[2]
+    v2 = vx * vx + vy * vy + vz * vz
+    vn = vx * nx + vy * ny + vz * nz
+    
+    xpcn = -1.0
+    if v2 != 0.0:
+        # |cos| gives the acute angle directly (no flip above 90 degrees)
+        c = min(abs(vn) / math.sqrt(v2), 1.0)
+        xpcn = math.degrees(math.acos(c))
+    
+    # H -> X and H -> PiCenter
+    hxx, hxy, hxz = x_pos[0] - h_pos[0], x_pos[1] - h_pos[1], x_pos[2] - h_pos[2]
+    hcx, hcy, hcz = pi_center[0] - h_pos[0], pi_center[1] - h_pos[1], pi_center[2] - h_pos[2]
+    hx2 = hxx * hxx + hxy * hxy + hxz * hxz
+    hc2 = hcx * hcx + hcy * hcy + hcz * hcz
+    
+    xh_pi = -1.0
+    if hx2 != 0.0 and hc2 != 0.0:
+        c = min(max((hxx * hcx + hxy * hcy + hxz * hcz) / math.sqrt(hx2 * hc2), -1.0), 1.0)
+        xh_pi = math.degrees(math.acos(c))
+    
+    # Hudson theta (X -> H must point towards the ring: positive projection on X -> PiCenter)
+    theta = -1.0
+    if v2 != 0.0 and -(hxx * vx + hxy * vy + hxz * vz) > 0.0 and hx2 != 0.0:
+        c = min(abs(nx * hxx + ny * hxy + nz * hxz) / math.sqrt(hx2), 1.0)
+        theta = math.degrees(math.acos(c))
+    
+    # Projection of X onto the ring plane: in-plane part of X -> PiCenter (Pythagoras),
+    # clamped at 0 against cancellation when X lies on the normal
+    proj = math.sqrt(max(v2 - vn * vn, 0.0))
+    
+    return xpcn, xh_pi, theta, proj
+
+def _interaction_geometry_pairs_impl(pi_centers, pi_normals, x_pos, h_pos):
+    """interaction_geometry over M candidates given as (M, 3) arrays. Returns an (M, 4) array."""
+    out = np.empty((x_pos.shape[0], 4))
+    # Candidates are independent: each iteration writes only its own row
+    for i in prange(x_pos.shape[0]):
+        xpcn, xh_pi, theta, proj = interaction_geometry(pi_centers[i], pi_normals[i], x_pos[i], h_pos[i])
+        out[i, 0] = xpcn
+        out[i, 1] = xh_pi
+        out[i, 2] = theta
+        out[i, 3] = proj
+    return out
+
+if HAS_NUMBA:
+    interaction_geometry = numba.njit(cache=True, fastmath=True)(_interaction_geometry_impl)
+    interaction_geometry_pairs = numba.njit(cache=True, fastmath=True)(_interaction_geometry_pairs_impl)
+    # Multi-threaded variant; only for callers that are not already running concurrently
+    interaction_geometry_pairs_parallel = numba.njit(cache=True, fastmath=True, parallel=True)(
+        _interaction_geometry_pairs_impl)
+else:
+    interaction_geometry = _interaction_geometry_impl
+    # Without numba, geometry.calculate_interaction_geometry_batch uses its NumPy path
+    interaction_geometry_pairs = interaction_geometry_pairs_parallel = None
@@ -0,0 +1,49 @@
+"""
+_geom_scalar.py
+Pure-Python geometry on single 3-vectors (tuples, lists or 1-D arrays), unpacked into
+scalars and computed with math: at this size, ndarray overhead dominates NumPy calls.
+"""
+import math
+
+def distance(a, b) -> float:
+    dx, dy, dz = a[0] - b[0], a[1] - b[1], a[2] - b[2]
+    return math.sqrt(dx * dx + dy * dy + dz * dz)
+
+def xpcn_angle(x_pos, pi_center, pi_normal):
+    """Plevin: Angle between X-PiCenter vector and (unit) Normal vector, None if X is on the center."""
+    vx, vy, vz = pi_center[0] - x_pos[0], pi_center[1] - x_pos[1], pi_center[2] - x_pos[2]
+    v2 = vx * vx + vy * vy + vz * vz
+    if v2 == 0.0:
+        return None
+    # Acute angle between the line and the normal: |cos| folds theta and 180 - theta together
+    vn = vx * pi_normal[0] + vy * pi_normal[1] + vz * pi_normal[2]
+    return math.degrees(math.acos(min(abs(vn) / math.sqrt(v2), 1.0)))
+
+def xh_picenter_angle(pi_center, x_pos, h_pos):
+    """Plevin: Angle between H-X vector and H-PiCenter vector, None if H is on X or the center."""
+    hxx, hxy, hxz = x_pos[0] - h_pos[0], x_pos[1] - h_pos[1], x_pos[2] - h_pos[2]
+    hcx, hcy, hcz = pi_center[0] - h_pos[0], pi_center[1] - h_pos[1], pi_center[2] - h_pos[2]
+    hx2 = hxx * hxx + hxy * hxy + hxz * hxz
+    hc2 = hcx * hcx + hcy * hcy + hcz * hcz
+    if hx2 == 0.0 or hc2 == 0.0:
+        return None
+    c = min(max((hxx * hcx + hxy * hcy + hxz * hcz) / math.sqrt(hx2 * hc2), -1.0), 1.0)
+    return math.degrees(math.acos(c))
+
+def hudson_theta(pi_center, x_pos, h_pos, normal):
+    """Hudson: Angle between X-H vector and (unit) Normal vector, None unless H points towards the ring."""
+    vx, vy, vz = pi_center[0] - x_pos[0], pi_center[1] - x_pos[1], pi_center[2] - x_pos[2]
+    xhx, xhy, xhz = h_pos[0] - x_pos[0], h_pos[1] - x_pos[1], h_pos[2] - x_pos[2]
+    xh2 = xhx * xhx + xhy * xhy + xhz * xhz
+    # Projection check: X -> H must have a positive component along X -> PiCenter
+    if (vx == 0.0 and vy == 0.0 and vz == 0.0) or xhx * vx + xhy * vy + xhz * vz <= 0.0 or xh2 == 0.0:
+        return None
+    c = min(abs(normal[0] * xhx + normal[1] * xhy + normal[2] * xhz) / math.sqrt(xh2), 1.0)
+    return math.degrees(math.acos(c))
+
+def projection_dist(normal, pi_center, x_pos) -> float:
+    """Hudson: Distance from the Pi center to the projection of X onto the plane (unit normal)."""
+    # |d|^2 = in-plane^2 + (d.n)^2, so no projection point is needed
+    dx, dy, dz = x_pos[0] - pi_center[0], x_pos[1] - pi_center[1], x_pos[2] - pi_center[2]
+    dn = dx * normal[0] + dy * normal[1] + dz * normal[2]
+    return math.sqrt(max(dx * dx + dy * dy + dz * dz - dn * dn, 0.0))
@@ -8,19 +8,25 @@ import sys
 import re
 import multiprocessing
 import logging
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
 import gemmi
+import numpy as np
 import json
 import csv
+import operator
 import os
 from pathlib import Path
-from typing import List, Dict, Any, Tuple, Optional, Set
+from typing import List, Dict, Any, Iterable, Tuple, Optional, Set, Union
 
 # Ensure package is accessible
 try:
     from xpid import prep, core, config
+    from xpid._compat import HAS_NUMBA, HAS_ORJSON, numba, orjson
 except ImportError:
     sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
     from xpid import prep, core, config
+    from xpid._compat import HAS_NUMBA, HAS_ORJSON, numba, orjson
 
 # --- Constants ---
 H_MODE_MAP = {
@@ -28,6 +34,12 @@ H_MODE_MAP = {
     3: "ReAdd", 4: "ReAddButWater", 5: "ReAddKnown"
 }
 
+# Output files are flushed in 1 MiB blocks
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Files submitted ahead per worker; bounds the results held before they are written
+IN_FLIGHT_PER_JOB = 2
+
 SIMPLE_COLS = [
     'pdb', 'resolution', 
     'pi_chain', 'pi_res', 'pi_id', 
@@ -35,6 +47,26 @@ SIMPLE_COLS = [
     'dist_X_Pi', 'is_plevin', 'is_hudson', 'remark'
 ]
 
+# Layout of a detection record (core field order) as (field, NumPy dtype).
+# 'U' columns are sized per chunk to the longest value.
+RESULT_FIELDS = (
+    ('pdb', 'U'), ('model', 'U'), ('resolution', 'f8'),
+    ('pi_chain', 'U'), ('pi_res', 'U'), ('pi_id', 'i8'),
+    ('X_chain', 'U'), ('X_res', 'U'), ('X_id', 'i8'), ('X_atom', 'U'), ('H_atom', 'U'),
+    ('dist_X_Pi', 'f8'), ('is_plevin', 'i8'), ('is_hudson', 'i8'), ('remark', 'U'),
+    ('pi_ss_type', 'U'), ('pi_ss_id', 'i8'), ('X_ss_type', 'U'), ('X_ss_id', 'i8'),
+    ('pi_avg_b', 'f8'), ('pi_center_x', 'f8'), ('pi_center_y', 'f8'), ('pi_center_z', 'f8'),
+    ('X_b', 'f8'), ('X_xyz_x', 'f8'), ('X_xyz_y', 'f8'), ('X_xyz_z', 'f8'),
+    ('seq_sep', 'i8'), ('theta', 'f8'), ('angle_XH_Pi', 'f8'), ('angle_XPCN', 'f8'),
+    ('proj_dist', 'f8'),
+)
+# Float fields that may be None in a record; stored as NaN in arrays
+NULLABLE_FIELDS = ('proj_dist',)
+
+# 4-character PDB ID + .cif/.pdb, optionally gzipped (at most 11 characters)
+PDB_FILE_PATTERN = re.compile(r'^[a-zA-Z0-9]{4}\.(cif|pdb)(\.gz)?$', re.IGNORECASE)
+PDB_ID_PREFIX = re.compile(r'^[a-zA-Z0-9]{4}\.')
+
 # --- Logging ---
 logger = logging.getLogger('xpid')
 
@@ -56,11 +88,48 @@ def setup_logging(log_file: Path):
         force=True 
     )
 
+# --- Result Arrays ---
+
+def records_to_array(results: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Packs detection records into one structured array (RESULT_FIELDS layout).
+    Workers return this instead of a list of dicts: one buffer to pickle, not ~30 objects per row.
+    """
+    names = [name for name, _ in RESULT_FIELDS]
+    nullable = [names.index(name) for name in NULLABLE_FIELDS]
+    rows = []
+    for row in map(operator.itemgetter(*names), results):
+        if any(row[i] is None for i in nullable):
+            row = tuple(float('nan') if (i in nullable and v is None) else v for i, v in enumerate(row))
+        rows.append(row)
+
+    dtype = []
+    for i, (name, kind) in enumerate(RESULT_FIELDS):
+        if kind == 'U':
+            kind = f"U{max(1, max(len(row[i]) for row in rows))}"
+        dtype.append((name, kind))
+    return np.array(rows, dtype=dtype)
+
+def _array_rows(arr: np.ndarray, fieldnames: Tuple[str, ...]) -> List[tuple]:
+    """Rows of a result array as Python tuples (NaN in nullable fields restored to None)."""
+    rows = arr[list(fieldnames)].tolist()
+    for name in NULLABLE_FIELDS:
+        if name in fieldnames and np.isnan(arr[name]).any():
+            i = fieldnames.index(name)
+            rows = [row[:i] + (None,) + row[i + 1:] if row[i] != row[i] else row for row in rows]
+    return rows
+
 # --- Helper Classes (Streaming) ---
 
+def _dump_record(item: Dict[str, Any]) -> bytes:
+    """Serializes one result record as compact UTF-8 JSON (orjson when installed)."""
+    if HAS_ORJSON:
+        return orjson.dumps(item, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(item, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
 class ResultStreamer:
     """
-    Handles streaming output to CSV or JSON files to prevent Memory OOM.
+    Handles streaming output to CSV, JSON or JSON Lines files to prevent Memory OOM.
     Writes data incrementally as it becomes available.
     """
     def __init__(self, output_path: Path, file_type: str, verbose: bool):
@@ -69,82 +138,98 @@ class ResultStreamer:
         self.verbose = verbose
         self.file_handle = None
         self.csv_writer = None
+        self.fieldnames = None
+        self.row_getter = None
         self.is_first_chunk = True
         self.has_written_data = False
 
     def __enter__(self):
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
-        self.file_handle = open(self.output_path, 'w', newline='', encoding='utf-8')
+        if self.file_type == 'csv':
+            self.file_handle = open(self.output_path, 'w', newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+        else:
+            # JSON records are serialized straight to bytes
+            self.file_handle = open(self.output_path, 'wb', buffering=WRITE_BUFFER_SIZE)
         
         if self.file_type == 'json':
-            self.file_handle.write('[\n')
+            self.file_handle.write(b'[\n')
         
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.file_type == 'json':
-            self.file_handle.write('\n]')
+            self.file_handle.write(b'\n]')
+        elif self.file_type == 'jsonl' and self.has_written_data:
+            self.file_handle.write(b'\n')
         
         if self.file_handle:
             self.file_handle.close()
 
-    def _get_fieldnames(self, first_record: Dict[str, Any]) -> List[str]:
+    def _get_fieldnames(self, record_keys: Iterable[str]) -> List[str]:
         if self.verbose:
-            return list(first_record.keys())
+            return list(record_keys)
         else:
-            keys = list(first_record.keys())
+            keys = list(record_keys)
             return [k for k in SIMPLE_COLS if k in keys]
 
-    def write_chunk(self, results: List[Dict[str, Any]]):
-        if not results:
+    def write_chunk(self, results: Union[List[Dict[str, Any]], np.ndarray]):
+        """Writes a list of records or a structured result array (see records_to_array)."""
+        if len(results) == 0:
             return
 
         self.has_written_data = True
+        is_array = isinstance(results, np.ndarray)
+
+        # Output columns are fixed by the first record and reused for every later chunk
+        if self.fieldnames is None:
+            keys = results.dtype.names if is_array else results[0].keys()
+            self.fieldnames = tuple(self._get_fieldnames(keys))
+            if self.file_type == 'csv':
+                self.csv_writer = csv.writer(self.file_handle)
+                self.csv_writer.writerow(self.fieldnames)
+                self.row_getter = operator.itemgetter(*self.fieldnames)
 
         if self.file_type == 'csv':
-            if self.is_first_chunk:
-                fieldnames = self._get_fieldnames(results[0])
-                self.csv_writer = csv.DictWriter(self.file_handle, fieldnames=fieldnames, extrasaction='ignore')
-                self.csv_writer.writeheader()
-                self.is_first_chunk = False
-            
-            self.csv_writer.writerows(results)
-
-        elif self.file_type == 'json':
-            keys_to_keep = None
-            if not self.verbose and self.is_first_chunk:
-                sample_keys = results[0].keys()
-                keys_to_keep = set([k for k in SIMPLE_COLS if k in sample_keys])
-
-            for item in results:
-                if not self.verbose:
-                    if keys_to_keep is None:
-                        sample_keys = item.keys()
-                        keys_to_keep = set([k for k in SIMPLE_COLS if k in sample_keys])
-                    clean_item = {k: v for k, v in item.items() if k in keys_to_keep}
-                else:
-                    clean_item = item
+            if is_array:
+                self.csv_writer.writerows(_array_rows(results, self.fieldnames))
+            else:
+                self.csv_writer.writerows(map(self.row_getter, results))
+
+        else:
+            # JSON Lines: one compact object per line. JSON: the same lines, framed as an array.
+            separator = b'\n' if self.file_type == 'jsonl' else b',\n'
+            fieldnames = self.fieldnames
+            if is_array:
+                records = (dict(zip(fieldnames, row)) for row in _array_rows(results, fieldnames))
+            elif not self.verbose:
+                records = ({k: item[k] for k in fieldnames} for item in results)
+            else:
+                records = results
 
+            for item in records:
                 if not self.is_first_chunk:
-                    self.file_handle.write(',\n')
+                    self.file_handle.write(separator)
                 else:
                     self.is_first_chunk = False
                 
-                json.dump(clean_item, self.file_handle, indent=2)
+                self.file_handle.write(_dump_record(item))
 
 # --- Helpers ---
 
 def find_files(inputs: List[str]) -> List[Path]:
     file_list = set()
-    pattern = re.compile(r'^[a-zA-Z0-9]{4}\.(cif|pdb)(\.gz)?$', re.IGNORECASE)
     for inp in inputs:
         path = Path(inp)
         if path.is_file():
             file_list.add(path.resolve())
         elif path.is_dir():
-            for p in path.rglob("*"):
-                if p.is_file() and pattern.match(p.name):
-                    file_list.add(p.resolve())
+            # Match names before touching the filesystem: a PDB mirror is mostly non-matching entries
+            for root, _, names in os.walk(path):
+                for name in names:
+                    if len(name) <= 11 and PDB_FILE_PATTERN.match(name):
+                        p = Path(root) / name
+                        if p.is_file():
+                            file_list.add(p.resolve())
     return sorted(list(file_list))
 
 def save_single_file_results(results: List[Dict[str, Any]], output_path: Path, file_type: str, verbose: bool) -> None:
@@ -152,13 +237,32 @@ def save_single_file_results(results: List[Dict[str, Any]], output_path: Path, f
     with ResultStreamer(output_path, file_type, verbose) as streamer:
         streamer.write_chunk(results)
 
-def process_one_file(args_packet: Tuple) -> Tuple[Optional[str], int, Optional[List[Dict[str, Any]]], Optional[str]]:
-    filepath, mon_lib, ftype, hmode, output_dir, separate_mode, filters, verbose, model_mode = args_packet
-    
-    if re.match(r'^[a-zA-Z0-9]{4}\.', filepath.name):
-        pdb_name = filepath.name[:4]
-    else:
-        pdb_name = filepath.stem.replace('.cif', '').replace('.pdb', '')
+# --- Worker State ---
+# Run-wide settings, set once per worker process so tasks only carry (path, pdb_name).
+_WORKER_SETTINGS: Dict[str, Any] = {}
+
+def init_worker(settings: Dict[str, Any]) -> None:
+    """ProcessPoolExecutor initializer: stores run-wide settings and preloads the Monomer Library."""
+    _WORKER_SETTINGS.clear()
+    _WORKER_SETTINGS.update(settings)
+    # Files are already spread over jobs processes; numba threads on top would oversubscribe
+    if HAS_NUMBA and settings['jobs'] > 1:
+        numba.set_num_threads(1)
+    # Modes 0 (NoChange) and 2 (Remove) never touch the Monomer Library
+    if settings['h_mode'] not in (0, config.H_CHANGE_REMOVE):
+        prep.init_worker(settings['mon_lib'])
+
+def get_pdb_name(filepath: Path) -> str:
+    """Derives the entry name reported in results from a structure file name."""
+    if PDB_ID_PREFIX.match(filepath.name):
+        return filepath.name[:4]
+    return filepath.stem.replace('.cif', '').replace('.pdb', '')
+
+def process_one_file(task: Tuple[Path, str]) -> Tuple[Optional[str], int, Optional[np.ndarray], Optional[str]]:
+    filepath, pdb_name = task
+    s = _WORKER_SETTINGS
+    mon_lib, ftype, hmode, output_dir = s['mon_lib'], s['ftype'], s['h_mode'], s['output_dir']
+    separate_mode, filters, verbose, model_mode = s['separate'], s['filters'], s['verbose'], s['model_mode']
     
     try:
         try:
@@ -166,6 +270,11 @@ def process_one_file(args_packet: Tuple) -> Tuple[Optional[str], int, Optional[L
         except Exception as e:
             return (f"Read Error ({pdb_name}): {e}", 0, None, None)
 
+        # Only the first model is analysed by default: drop the rest of an ensemble
+        # before hydrogen preparation and detection touch it
+        if model_mode == '0' and len(structure) > 1:
+            del structure[1:]
+
         structure = prep.add_hydrogens_memory(structure, mon_lib, h_change_val=hmode)
         if not structure:
             return (f"AddH Failed ({pdb_name})", 0, None, None)
@@ -188,7 +297,7 @@ def process_one_file(args_packet: Tuple) -> Tuple[Optional[str], int, Optional[L
                 save_single_file_results(results, out_path, ftype, verbose)
                 return (None, count, None, str(out_path.parent))
             else:
-                return (None, count, results, None)
+                return (None, count, records_to_array(results), None)
         else:
             return (None, 0, None, None)
             
@@ -222,8 +331,8 @@ def get_parser():
                           help="Override default output directory.")
     io_group.add_argument('--output-name', type=str, default='xpid_results', metavar='NAME',
                           help="Base name for the merged result file (default: 'xpid_results').")
-    io_group.add_argument('--file-type', default='json', choices=['json', 'csv'], 
-                          help="Output format. Default: json.")
+    io_group.add_argument('--file-type', default='json', choices=['json', 'jsonl', 'csv'], 
+                          help="Output format (jsonl: one JSON object per line). Default: json.")
     io_group.add_argument('-v', '--verbose', action='store_true', help="Output detailed metrics.")
     io_group.add_argument('--log', action='store_true', help="Save log file.")
 
@@ -344,10 +453,10 @@ def main():
     print("-" * 60)
     mon_lib_path = valid_lib_path
 
-    # 5. Filters
+    # 5. Filters (frozensets: O(1) membership in the detection loop)
     filters = {
-        'pi': [x.strip().upper() for x in args.pi_res.split(',')] if args.pi_res else None,
-        'donor': [x.strip().upper() for x in args.donor_res.split(',')] if args.donor_res else None,
+        'pi': frozenset(x.strip().upper() for x in args.pi_res.split(',')) if args.pi_res else None,
+        'donor': frozenset(x.strip().upper() for x in args.donor_res.split(',')) if args.donor_res else None,
         'donor_atom': None
     }
     if args.donor_atom:
@@ -357,7 +466,7 @@ def main():
             if inp not in valid_elements:
                 logger.error(f"Invalid donor element: '{inp}'. Allowed: C, N, O, S")
                 sys.exit(1)
-        filters['donor_atom'] = inputs
+        filters['donor_atom'] = frozenset(inputs)
 
     # 6. Status Log
     separate_mode = args.separate
@@ -373,11 +482,16 @@ def main():
     logger.info(f"Format     : {ftype.upper()} ({'Separate Files' if separate_mode else 'Merged File'})")
     logger.info(f"H-Mode     : {args.h_mode} ({h_mode_desc})")
     logger.info(f"Model      : {args.model} ({model_desc})")
-    logger.info(f"Filters    : {filters if any(filters.values()) else 'None'}")
+    filters_desc = {k: sorted(v) if v else None for k, v in filters.items()}
+    logger.info(f"Filters    : {filters_desc if any(filters.values()) else 'None'}")
     logger.info(f"Columns    : {output_mode_desc}")
 
     # 7. Execution
-    tasks = [(f, mon_lib_path, ftype, args.h_mode, str(output_dir), separate_mode, filters, args.verbose, args.model) for f in files]
+    settings = {
+        'mon_lib': mon_lib_path, 'ftype': ftype, 'h_mode': args.h_mode, 'output_dir': str(output_dir),
+        'separate': separate_mode, 'filters': filters, 'verbose': args.verbose, 'model_mode': args.model,
+        'jobs': args.jobs
+    }
     
     error_logs = []
     total_found = 0
@@ -392,20 +506,42 @@ def main():
             streamer = ResultStreamer(merge_file_path, ftype, args.verbose)
             streamer.__enter__()
 
-        with multiprocessing.Pool(args.jobs, maxtasksperchild=100) as pool:
-            for i, (err, count, data, out_path) in enumerate(pool.imap_unordered(process_one_file, tasks), 1):
-                if err: 
-                    error_logs.append(err)
-                    logger.warning(err)
-                
-                total_found += count
-                
-                if not separate_mode and data:
-                    streamer.write_chunk(data)
-                
-                msg = f"[INFO] Progress   : {i}/{len(files)} files processed..."
-                sys.stdout.write(f"\r{msg}")
-                sys.stdout.flush()
+        # Workers pull the next file as soon as they finish one, balancing mixed file sizes.
+        # Only a bounded window of files is in flight: a future is dropped once its result
+        # is written, so finished result arrays do not accumulate over the run.
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker, initargs=(settings,)) as pool:
+            pending_files = iter(files)
+            in_flight = set()
+            max_in_flight = IN_FLIGHT_PER_JOB * args.jobs
+            processed = 0
+            try:
+                while True:
+                    for f in islice(pending_files, max_in_flight - len(in_flight)):
+                        in_flight.add(pool.submit(process_one_file, (f, get_pdb_name(f))))
+                    if not in_flight:
+                        break
+
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        err, count, data, out_path = future.result()
+                        if err:
+                            error_logs.append(err)
+                            logger.warning(err)
+
+                        total_found += count
+
+                        if not separate_mode and data is not None:
+                            streamer.write_chunk(data)
+
+                        processed += 1
+                        msg = f"[INFO] Progress   : {processed}/{len(files)} files processed..."
+                        sys.stdout.write(f"\r{msg}")
+                        sys.stdout.flush()
+                    del done, future, data
+            except KeyboardInterrupt:
+                for future in in_flight:
+                    future.cancel()
+                raise
 
         if streamer:
             streamer.__exit__(None, None, None)
@@ -6,7 +6,7 @@ import gemmi
 import os
 import json
 from pathlib import Path
-from typing import Dict, Set, Optional
+from typing import Dict, FrozenSet, Optional
 
 # --- Configuration Management ---
 CONFIG_FILE = Path.home() / ".xpid_config.json"
@@ -91,26 +91,34 @@ DEFAULT_MON_LIB_PATH = _env_path if _env_path else _saved_path
 
 # H-Change Mode: 4 = ReAddButWater (Default)
 DEFAULT_H_CHANGE = 4 
+# 2 = Remove: handled without topology preparation
+H_CHANGE_REMOVE = 2
 
 # --- Atom Definitions ---
-RING_ATOMS: Dict[str, Set[str]] = {
-    'TRP': {'CD2', 'CE2', 'CE3', 'CZ2', 'CZ3', 'CH2'},
-    'TYR': {'CD1', 'CD2', 'CE1', 'CE2', 'CZ', 'CG'},
-    'PHE': {'CD1', 'CD2', 'CE1', 'CE2', 'CZ', 'CG'},
-    'HIS': {'CE1', 'ND1', 'NE2', 'CG', 'CD2'}
+# Ring definitions are fixed at import time: frozen so they cannot be mutated at runtime
+RING_ATOMS: Dict[str, FrozenSet[str]] = {
+    'TRP': frozenset({'CD2', 'CE2', 'CE3', 'CZ2', 'CZ3', 'CH2'}),
+    'TYR': frozenset({'CD1', 'CD2', 'CE1', 'CE2', 'CZ', 'CG'}),
+    'PHE': frozenset({'CD1', 'CD2', 'CE1', 'CE2', 'CZ', 'CG'}),
+    'HIS': frozenset({'CE1', 'ND1', 'NE2', 'CG', 'CD2'})
 }
 
-TRP_A_ATOMS: Dict[str, Set[str]] = {
-    'TRP': {'CD1', 'CD2', 'NE1', 'CG', 'CE2'}
+TRP_A_ATOMS: Dict[str, FrozenSet[str]] = {
+    'TRP': frozenset({'CD1', 'CD2', 'NE1', 'CG', 'CE2'})
 }
 
-TARGET_ELEMENTS_X = {gemmi.Element('C'), gemmi.Element('N'), gemmi.Element('O'), gemmi.Element('S')}
+# Elements as atomic numbers: compared without creating gemmi.Element objects
+TARGET_ELEMENTS_X_Z: FrozenSet[int] = frozenset({6, 7, 8, 16}) # C, N, O, S
 
-# Support both Hydrogen (H) and Deuterium (D) for neutron structures
-TARGET_ELEMENTS_H = {gemmi.Element('H'), gemmi.Element('D')}
+# Hydrogen and Deuterium (neutron structures) share atomic number 1 in gemmi
+TARGET_ELEMENTS_H_Z: FrozenSet[int] = frozenset({1})
 
 # --- Geometric Thresholds ---
 DIST_SEARCH_LIMIT = 6.0
 DIST_PLEVIN_MAX = 4.3
 DIST_HUDSON_MAX = 4.5
-DIST_CUTOFF_H = 1.3
\ No newline at end of file
+DIST_CUTOFF_H = 1.3
+
+# Squared forms, compared against squared distances to skip the sqrt
+DIST_PLEVIN_MAX_SQ = DIST_PLEVIN_MAX ** 2
+DIST_HUDSON_MAX_SQ = DIST_HUDSON_MAX ** 2
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+coords.py
+Per-model coordinate tables (SoA) addressed by NeighborSearch mark indices.
+Avoids repeated gemmi.Position -> NumPy conversions in the detection loop.
+"""
+import gemmi
+import numpy as np
+from typing import Dict, Iterable, List, Tuple
+
+# Row layout of ModelTable residue blocks
+Row = Tuple[float, float, float, int, float] # (x, y, z, atomic_number, b_iso)
+
+def _residue_rows(residue: gemmi.Residue) -> List[Row]:
+    return [(p.x, p.y, p.z, a.element.atomic_number, a.b_iso)
+            for a, p in ((a, a.pos) for a in residue)]
+
+class ModelTable:
+    """
+    Coordinate table for one model.
+    Residues are materialized lazily as blocks of (x, y, z, atomic_number, b_iso) rows the
+    first time one of their atoms is referenced, so solvent far from any ring costs nothing.
+    Coordinates stay float64: quantizing them to float32 shifts reported angles and
+    distances in their last rounded digit.
+    """
+    def __init__(self, model: gemmi.Model):
+        self.model = model
+        self._blocks: Dict[Tuple[int, int], List[Row]] = {}
+
+    def residue_rows(self, chain_idx: int, residue_idx: int) -> List[Row]:
+        key = (chain_idx, residue_idx)
+        block = self._blocks.get(key)
+        if block is None:
+            block = _residue_rows(self.model[chain_idx][residue_idx])
+            self._blocks[key] = block
+        return block
+
+    def pi_systems(self, chain_idx: int, residue_idx: int,
+                   ring_defs: List[Tuple[str, Iterable[str]]]) -> List[Tuple[str, List[Tuple[float, float, float]], List[float], str]]:
+        """
+        Ring atoms of one residue, read in a single pass over its atoms.
+        Values are taken from the cached residue rows; rings of a model are converted
+        to arrays together in geometry.get_pi_info_batch, not one by one.
+
+        Args:
+            ring_defs: (mode, ring_atom_names) pairs; incomplete rings are skipped.
+
+        Returns:
+            List of (mode, positions [(x, y, z)] * k, b_factors [b] * k, altloc of the first ring atom)
+        """
+        atoms = list(self.model[chain_idx][residue_idx])
+        names = [a.name for a in atoms]
+        systems = []
+        for mode, target_atoms in ring_defs:
+            idx = [i for i, name in enumerate(names) if name in target_atoms]
+            if len(idx) != len(target_atoms):
+                continue
+            rows = self.residue_rows(chain_idx, residue_idx)
+            systems.append((mode, [rows[i][:3] for i in idx], [rows[i][4] for i in idx], atoms[idx[0]].altloc))
+        return systems
+
+    def _gather_rows(self, marks: List[gemmi.NeighborSearch.Mark]) -> np.ndarray:
+        """Returns the (N, 5) rows of the atoms referenced by marks."""
+        blocks = self._blocks
+        rows = []
+        for mark in marks:
+            block = blocks.get((mark.chain_idx, mark.residue_idx))
+            if block is None:
+                block = self.residue_rows(mark.chain_idx, mark.residue_idx)
+            rows.append(block[mark.atom_idx])
+        return np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+    def search(self, ns: gemmi.NeighborSearch, pos: gemmi.Position, alt: str,
+               radius: float) -> Tuple[List[gemmi.NeighborSearch.Mark], np.ndarray, np.ndarray]:
+        """
+        NeighborSearch query unpacked into an SoA batch in one pass.
+
+        Returns:
+            (marks, coords (N, 3) float64, atomic_numbers (N,) int)
+        """
+        marks = ns.find_atoms(pos, alt, radius=radius)
+        rows = self._gather_rows(marks)
+        return marks, rows[:, :3], rows[:, 3].astype(np.int64)
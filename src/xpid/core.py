@@ -3,18 +3,29 @@ core.py
 Core logic for detecting XH-pi interactions based on geometric and topological criteria.
 Implements the Hudson and Plevin criteria.
 """
+import math
 import gemmi
 import numpy as np
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Union
 from . import config
+from . import coords
 from . import geometry
 from . import residue_ss
 
+def _element_mask(atomic_numbers: Iterable[int]) -> np.ndarray:
+    """Boolean lookup table indexed by atomic number, for vectorized element checks."""
+    mask = np.zeros(gemmi.Element('Og').atomic_number + 1, dtype=bool)
+    mask[list(atomic_numbers)] = True
+    return mask
+
+_IS_X_ELEMENT = _element_mask(config.TARGET_ELEMENTS_X_Z)
+_IS_H_ELEMENT = _element_mask(config.TARGET_ELEMENTS_H_Z)
+
 def detect_interactions_in_structure(structure: gemmi.Structure, 
                                      pdb_name: str,
-                                     filter_pi: Optional[List[str]] = None,
-                                     filter_donor: Optional[List[str]] = None,
-                                     filter_donor_atom: Optional[List[str]] = None,
+                                     filter_pi: Optional[Iterable[str]] = None,
+                                     filter_donor: Optional[Iterable[str]] = None,
+                                     filter_donor_atom: Optional[Iterable[str]] = None,
                                      model_mode: Union[str, int] = 0) -> List[Dict[str, Any]]:
     """
     Scans the structure for interactions.
@@ -22,6 +33,17 @@ def detect_interactions_in_structure(structure: gemmi.Structure,
     """
     results = []
     
+    # Filters are tested once per residue / donor candidate: use O(1) lookups
+    filter_pi = frozenset(filter_pi) if filter_pi else None
+    filter_donor = frozenset(filter_donor) if filter_donor else None
+    
+    # Donor elements are checked by atomic number, folded into the X element table
+    x_element_mask = _IS_X_ELEMENT
+    if filter_donor_atom:
+        donor_z = [gemmi.Element(name).atomic_number for name in filter_donor_atom
+                   if gemmi.Element(name).name == name]
+        x_element_mask = _IS_X_ELEMENT & _element_mask(donor_z)
+    
     if not structure or len(structure) == 0:
         return []
 
@@ -50,170 +72,264 @@ def detect_interactions_in_structure(structure: gemmi.Structure,
 
     resolution = structure.resolution if structure.resolution else 0.0
 
-    # Iterate selected models
+    # Secondary structure is annotated per structure (HELIX/SHEET records), not per model
+    ss_index = residue_ss.build_index(structure)
+
+    scan_args = (pdb_name, resolution, structure.cell, ss_index, filter_pi, filter_donor, x_element_mask)
+
+    # Models are scanned one at a time: the NeighborSearch build holds the GIL, so
+    # threads gain little, while the geometry pass can use all cores itself
     for model, model_id in models_with_ids:
-        # 1. Neighbor Search Grid
-        ns = gemmi.NeighborSearch(model, structure.cell, config.DIST_SEARCH_LIMIT)
-        ns.populate(include_h=True)
+        results.extend(_scan_model(model, model_id, *scan_args))
+    return results
+
+def _scan_model(model: gemmi.Model, model_id: str, pdb_name: str, resolution: float,
+                cell: gemmi.UnitCell, ss_index, filter_pi, filter_donor, 
+                x_element_mask: np.ndarray) -> List[Dict[str, Any]]:
+    """Scans one model with its own NeighborSearch."""
+    results = []
+    
+    # Every interaction needs an H (or D) atom: a hydrogen-free model (e.g. X-ray
+    # data read with --h-mode 0) is rejected by one C++ scan
+    if not model.has_hydrogen():
+        return results
+    
+    # Neighbor Search Grid
+    ns = gemmi.NeighborSearch(model, cell, config.DIST_SEARCH_LIMIT)
+    ns.populate(include_h=True)
+    table = coords.ModelTable(model)
+    
+    # 1. Collect the Pi systems of the model (main ring, plus the 5-ring for TRP)
+    systems = []
+    for chain_idx, chain in enumerate(model):
+        for residue_idx, residue in enumerate(chain):
+            res_name = residue.name
+            
+            if res_name not in config.RING_ATOMS and res_name not in config.TRP_A_ATOMS:
+                continue
+            
+            # Apply Pi Residue Filter
+            if filter_pi and res_name not in filter_pi:
+                continue
+
+            ring_defs = _ring_definitions(residue)
+            if not ring_defs:
+                continue
 
-        # 2. Build Secondary Structure Index
-        ss_index = residue_ss.build_index(structure)
+            for mode, ring_pos, ring_b, alt_pi in table.pi_systems(chain_idx, residue_idx, ring_defs):
+                systems.append((chain, residue, mode, ring_pos, ring_b, alt_pi))
+
+    if not systems:
+        return results
+
+    # 2. Fit all rings in batched calls
+    pi_infos = geometry.get_pi_info_batch([sys[3] for sys in systems], [sys[4] for sys in systems])
+
+    # 3. Gather (ring, X, H) candidates around every ring
+    donors = [] # (ring_idx, x_cra, x_pos, d2_x_pi)
+    pair_donor, pair_h_marks, pair_h_coords = [], [], []
+    x_cache = {} # A donor near several rings is resolved and searched for H only once
+    for ring_idx, ((_, _, _, _, _, alt_pi), pi_info) in enumerate(zip(systems, pi_infos)):
+        for x_cra, x_pos, d2_x_pi, h_marks, h_coords in _find_donors(
+                model, ns, table, pi_info, alt_pi, filter_donor, x_element_mask, x_cache):
+            pair_donor.extend([len(donors)] * len(h_marks))
+            pair_h_marks.extend(h_marks)
+            pair_h_coords.append(h_coords)
+            donors.append((ring_idx, x_cra, x_pos, d2_x_pi))
+
+    if not donors:
+        return results
+
+    # 4. Geometry and criteria for all candidates at once
+    pair_donor = np.array(pair_donor)
+    pair_ring = np.array([donor[0] for donor in donors])[pair_donor]
+    centers = np.array([info[1] for info in pi_infos])[pair_ring]
+    normals = np.array([info[2] for info in pi_infos])[pair_ring]
+    x_pos = np.array([donor[2] for donor in donors])[pair_donor]
+    d2_x_pi = np.array([donor[3] for donor in donors])[pair_donor]
+    
+    xpcn, xh_pi, theta, proj = geometry.calculate_interaction_geometry_batch(
+        centers, normals, x_pos, np.concatenate(pair_h_coords), parallel=True
+    )
+    
+    # NaN threshold: no Hudson criterion for this ring
+    ring_thresholds = [_proj_threshold(residue, mode) for _, residue, mode, _, _, _ in systems]
+    proj_threshold = np.array([np.nan if t is None else t for t in ring_thresholds])[pair_ring]
+    
+    # Comparisons against NaN are False, so undefined metrics never pass a criterion
+    with np.errstate(invalid='ignore'):
+        valid = ~(np.isnan(xpcn) | np.isnan(xh_pi) | np.isnan(theta))
+        plevin = valid & (d2_x_pi < config.DIST_PLEVIN_MAX_SQ) & (xh_pi > 120.0) & (xpcn < 25.0)
+        # X-Cpi <= DIST_HUDSON_MAX already holds for every candidate
+        hudson = valid & (theta <= 40.0) & (proj <= proj_threshold)
+    hits = np.flatnonzero(plevin | hudson)
+
+    # 5. Result Construction (ring and donor fields are built once and reused)
+    ring_fields, donor_fields = {}, {}
+    for p, is_plevin, is_hudson, xpcn_angle, xh_pi_angle, theta_p, proj_p in zip(
+            hits.tolist(), plevin[hits].tolist(), hudson[hits].tolist(),
+            xpcn[hits].tolist(), xh_pi[hits].tolist(), theta[hits].tolist(), proj[hits].tolist()):
+        d = pair_donor[p]
+        ring_idx, x_cra, _, _ = donors[d]
+        chain, residue, mode, _, _, _ = systems[ring_idx]
+        
+        if ring_idx not in ring_fields:
+            ring_fields[ring_idx] = _ring_fields(chain, residue, mode, pi_infos[ring_idx], ss_index)
+        if d not in donor_fields:
+            donor_fields[d] = _donor_fields(chain, residue, x_cra, x_pos[p], d2_x_pi[p], ss_index)
+        
+        if ring_thresholds[ring_idx] is None or math.isnan(proj_p):
+            proj_p = None
         
-        for chain in model:
-            for residue in chain:
-                res_name = residue.name
-                
-                # Apply Pi Residue Filter
-                if filter_pi and res_name not in filter_pi:
-                    continue
-
-                # Scan Main Pi Systems
-                if res_name in config.RING_ATOMS:
-                    results.extend(_detect_residue(
-                        pdb_name, resolution, model, model_id, chain, residue, ns, ss_index,
-                        config.RING_ATOMS[res_name], 'main', filter_donor, filter_donor_atom
-                    ))
-                
-                # Scan Trp A Systems
-                if res_name in config.TRP_A_ATOMS:
-                    results.extend(_detect_residue(
-                        pdb_name, resolution, model, model_id, chain, residue, ns, ss_index,
-                        config.TRP_A_ATOMS[res_name], 'trpA', filter_donor, filter_donor_atom
-                    ))
+        results.append(_make_record(
+            pdb_name, model_id, resolution, chain, residue, x_cra,
+            pair_h_marks[p].to_cra(model).atom.name, int(is_plevin), int(is_hudson),
+            ring_fields[ring_idx], donor_fields[d], theta_p, xh_pi_angle, xpcn_angle, proj_p
+        ))
     return results
 
-def _detect_residue(pdb_name, resolution, model, model_id, chain, residue, ns, ss_index, 
-                    target_atoms, mode, filter_donor, filter_donor_atom):
-    hits = []
+def _ring_definitions(residue: gemmi.Residue) -> List[Tuple[str, Iterable[str]]]:
+    """
+    Returns the (mode, ring_atom_names) definitions that apply to a residue.
+    """
+    # Truncated side chains (common at low resolution) cannot hold a complete ring;
+    # reject them on the atom count before reading any atom
+    n_atoms = len(residue)
+    ring_defs = []
+    if residue.name in config.RING_ATOMS:
+        ring_defs.append(('main', config.RING_ATOMS[residue.name]))
+    if residue.name in config.TRP_A_ATOMS:
+        ring_defs.append(('trpA', config.TRP_A_ATOMS[residue.name]))
+    return [(mode, target_atoms) for mode, target_atoms in ring_defs if n_atoms >= len(target_atoms)]
+
+def _proj_threshold(residue: gemmi.Residue, mode: str) -> Optional[float]:
+    """Hudson limit on the X projection - Pi center distance for a ring (None: not applicable)."""
+    if mode == 'trpA': return 1.6
+    elif residue.name == 'HIS': return 1.6
+    elif residue.name in ['TRP', 'TYR', 'PHE']: return 2.0
+    return None
+
+def _find_donors(model, ns, table, pi_info, alt_pi, filter_donor, x_element_mask, x_cache):
+    """
+    X donor candidates around one ring, with the H atoms bonded to each.
+    x_cache maps (chain_idx, residue_idx, atom_idx) to the donor's (x_cra, h_marks, h_coords),
+    or None for atoms that are filtered out or carry no H; it is shared by all rings of a model.
+    Returns a list of (x_cra, x_pos, d2_x_pi, h_marks, h_coords (K, 3)).
+    """
+    pi_center, pi_center_arr, _, _ = pi_info
     
-    # --- Pi Side ---
-    pi_atoms = [atom for atom in residue if atom.name in target_atoms]
-    if len(pi_atoms) != len(target_atoms): return []
+    # --- Search X Donors ---
+    # Distance cut-off is applied by gemmi (C++) on the periodic grid, so only
+    # atoms with a copy within DIST_HUDSON_MAX reach Python
+    x_candidates, x_coords, x_z = table.search(ns, pi_center, alt_pi, config.DIST_HUDSON_MAX)
+    if not x_candidates: return []
     
-    pi_center, pi_center_arr, pi_normal, pi_b_mean = geometry.get_pi_info(pi_atoms)
-    alt_pi = pi_atoms[0].altloc
+    # Batched distance filter on original coordinates (drops symmetry mates)
+    # and element check: one (N,3) pass instead of N scalar calls
+    x_d2 = ((x_coords - pi_center_arr) ** 2).sum(axis=1)
+    x_keep = np.flatnonzero((x_d2 <= config.DIST_HUDSON_MAX_SQ) & x_element_mask[x_z])
     
-    # --- Search X Donors ---
-    x_candidates = ns.find_atoms(pi_center, alt=alt_pi, radius=config.DIST_SEARCH_LIMIT)
+    donors = []
+    for i in x_keep:
+        x_mark = x_candidates[i]
+        key = (x_mark.chain_idx, x_mark.residue_idx, x_mark.atom_idx)
+        if key in x_cache:
+            donor = x_cache[key]
+        else:
+            donor = x_cache[key] = _resolve_donor(model, ns, table, x_mark, filter_donor)
+        if donor is None: continue
+        
+        x_cra, h_marks, h_coords = donor
+        donors.append((x_cra, x_coords[i], x_d2[i], h_marks, h_coords))
+    return donors
+
+def _resolve_donor(model, ns, table, x_mark, filter_donor):
+    """Returns (x_cra, h_marks, h_coords) for a donor candidate, or None if it is filtered out or has no H."""
+    x_cra = x_mark.to_cra(model)
+    
+    # Filters
+    if filter_donor and x_cra.residue.name not in filter_donor: return None
+    
+    # --- Search H ---
+    x_atom = x_cra.atom
+    h_candidates, h_coords, h_z = table.search(ns, x_atom.pos, x_atom.altloc, config.DIST_CUTOFF_H)
+    h_keep = np.flatnonzero(_IS_H_ELEMENT[h_z])
+    if len(h_keep) == 0: return None
+    
+    return x_cra, [h_candidates[j] for j in h_keep], h_coords[h_keep]
+
+def _ring_fields(chain, residue, mode, pi_info, ss_index) -> Tuple:
+    """Output fields shared by every hit of a ring."""
+    pi_center_arr, pi_b_mean = pi_info[1], pi_info[3]
+    pi_ss_type, pi_ss_uid = residue_ss.get_info(chain.name, residue.seqid.num, ss_index)
+    pi_cx, pi_cy, pi_cz = np.round(pi_center_arr, 3)
+    
+    remark = ""
+    if residue.name == "TRP":
+        remark = "6-ring" if mode == "main" else "5-ring"
+    return remark, pi_ss_type, pi_ss_uid, round(pi_b_mean, 2), pi_cx, pi_cy, pi_cz
+
+def _donor_fields(chain, residue, x_cra, x_pos_arr, d2_x_pi, ss_index) -> Tuple:
+    """Output fields shared by every hit of a donor around one ring."""
+    x_ss_type, x_ss_uid = residue_ss.get_info(x_cra.chain.name, x_cra.residue.seqid.num, ss_index)
+    
+    if chain.name == x_cra.chain.name:
+        try:
+            seq_sep = abs(residue.seqid.num - x_cra.residue.seqid.num)
+        except:
+            seq_sep = -1
+    else:
+        seq_sep = -1
+    
+    x_cx, x_cy, x_cz = np.round(x_pos_arr, 3)
+    return (x_ss_type, x_ss_uid, seq_sep, round(math.sqrt(d2_x_pi), 3),
+            round(x_cra.atom.b_iso, 2), x_cx, x_cy, x_cz)
+
+def _make_record(pdb_name, model_id, resolution, chain, residue, x_cra, h_name, plevin, hudson,
+                 pi_fields, x_fields, theta, xh_pi_angle, xpcn_angle, proj_dist) -> Dict[str, Any]:
+    remark, pi_ss_type, pi_ss_uid, pi_avg_b, pi_cx, pi_cy, pi_cz = pi_fields
+    x_ss_type, x_ss_uid, seq_sep, dist_x_pi, x_b, x_cx, x_cy, x_cz = x_fields
     
-    for x_mark in x_candidates:
-        x_cra = x_mark.to_cra(model)
-        x_atom = x_cra.atom
-        x_res_name = x_cra.residue.name
+    return {
+        # Metadata
+        'pdb': pdb_name,
+        'model': model_id, # [Modified] Passed explicitly as string
+        'resolution': resolution,
         
-        # Element Check
-        if x_atom.element not in config.TARGET_ELEMENTS_X: continue
+        # Pi
+        'pi_chain': chain.name,
+        'pi_res': residue.name,
+        'pi_id': residue.seqid.num,
         
-        # Filters
-        if filter_donor and x_res_name not in filter_donor: continue
-        if filter_donor_atom and x_atom.element.name not in filter_donor_atom: continue
-
-        x_pos_arr = np.array(x_atom.pos.tolist())
-        dist_x_pi = geometry.calculate_distance(x_pos_arr, pi_center_arr)
-        if dist_x_pi > config.DIST_HUDSON_MAX: continue
+        # X
+        'X_chain': x_cra.chain.name,
+        'X_res': x_cra.residue.name,
+        'X_id': x_cra.residue.seqid.num,
+        'X_atom': x_cra.atom.name,
+        'H_atom': h_name,
+        'dist_X_Pi': dist_x_pi,
         
-        # --- Search H ---
-        h_candidates = ns.find_atoms(x_atom.pos, alt=x_atom.altloc, radius=config.DIST_CUTOFF_H)
+        # Validation
+        'is_plevin': plevin,
+        'is_hudson': hudson,
+        'remark': remark,
         
-        for h_mark in h_candidates:
-            h_cra = h_mark.to_cra(model)
-            h_atom = h_cra.atom
-            
-            if h_atom.element not in config.TARGET_ELEMENTS_H: continue
-            
-            # --- Geometric Checks ---
-            h_pos_arr = np.array(h_atom.pos.tolist())
-            xpcn_angle = geometry.calculate_xpcn_angle(x_pos_arr, pi_center_arr, pi_normal)
-            xh_pi_angle = geometry.calculate_xh_picenter_angle(pi_center_arr, x_pos_arr, h_pos_arr)
-            theta = geometry.calculate_hudson_theta(pi_center_arr, x_pos_arr, h_pos_arr, pi_normal)
-            
-            if xh_pi_angle is None or theta is None or xpcn_angle is None: continue
-            
-            # --- Criteria ---
-            plevin = 0
-            if (dist_x_pi < config.DIST_PLEVIN_MAX and 
-                xh_pi_angle > 120.0 and 
-                xpcn_angle < 25.0):
-                plevin = 1
-            
-            proj_threshold = None
-            if mode == 'trpA': proj_threshold = 1.6
-            elif residue.name == 'HIS': proj_threshold = 1.6
-            elif residue.name in ['TRP', 'TYR', 'PHE']: proj_threshold = 2.0
-            
-            hudson = 0
-            proj_dist = None
-            if proj_threshold is not None:
-                proj_dist = geometry.calculate_projection_dist(pi_normal, pi_center_arr, x_pos_arr)
-                if (theta <= 40.0 and 
-                    dist_x_pi <= config.DIST_HUDSON_MAX and 
-                    proj_dist is not None and 
-                    proj_dist <= proj_threshold):
-                    hudson = 1
-
-            if plevin == 0 and hudson == 0: continue
-            
-            # --- Result Construction ---
-            pi_ss_type, pi_ss_uid = residue_ss.get_info(chain.name, residue.seqid.num, ss_index)
-            x_ss_type, x_ss_uid = residue_ss.get_info(x_cra.chain.name, x_cra.residue.seqid.num, ss_index)
-
-            if chain.name == x_cra.chain.name:
-                try:
-                    seq_sep = abs(residue.seqid.num - x_cra.residue.seqid.num)
-                except:
-                    seq_sep = -1
-            else:
-                seq_sep = -1
-
-            remark = ""
-            if residue.name == "TRP":
-                remark = "6-ring" if mode == "main" else "5-ring"
-
-            pi_cx, pi_cy, pi_cz = np.round(pi_center_arr, 3)
-            x_cx, x_cy, x_cz = np.round(x_pos_arr, 3)
-
-            hits.append({
-                # Metadata
-                'pdb': pdb_name,
-                'model': model_id, # [Modified] Passed explicitly as string
-                'resolution': resolution,
-                
-                # Pi
-                'pi_chain': chain.name,
-                'pi_res': residue.name,
-                'pi_id': residue.seqid.num,
-                
-                # X
-                'X_chain': x_cra.chain.name,
-                'X_res': x_res_name,
-                'X_id': x_cra.residue.seqid.num,
-                'X_atom': x_atom.name,
-                'H_atom': h_atom.name,
-                'dist_X_Pi': round(dist_x_pi, 3),
-                
-                # Validation
-                'is_plevin': plevin,
-                'is_hudson': hudson,
-                'remark': remark,
-                
-                # Detailed
-                'pi_ss_type': pi_ss_type,
-                'pi_ss_id': pi_ss_uid,
-                'X_ss_type': x_ss_type,
-                'X_ss_id': x_ss_uid,
-                'pi_avg_b': round(pi_b_mean, 2),
-                'pi_center_x': pi_cx,
-                'pi_center_y': pi_cy,
-                'pi_center_z': pi_cz,
-                'X_b': round(x_atom.b_iso, 2),
-                'X_xyz_x': x_cx,
-                'X_xyz_y': x_cy,
-                'X_xyz_z': x_cz,
-                'seq_sep': seq_sep,
-                'theta': round(theta, 2),
-                'angle_XH_Pi': round(xh_pi_angle, 2),
-                'angle_XPCN': round(xpcn_angle, 2),
-                'proj_dist': round(proj_dist, 3) if proj_dist is not None else None,
-            })
-            
-    return hits
\ No newline at end of file
+        # Detailed
+        'pi_ss_type': pi_ss_type,
+        'pi_ss_id': pi_ss_uid,
+        'X_ss_type': x_ss_type,
+        'X_ss_id': x_ss_uid,
+        'pi_avg_b': pi_avg_b,
+        'pi_center_x': pi_cx,
+        'pi_center_y': pi_cy,
+        'pi_center_z': pi_cz,
+        'X_b': x_b,
+        'X_xyz_x': x_cx,
+        'X_xyz_y': x_cy,
+        'X_xyz_z': x_cz,
+        'seq_sep': seq_sep,
+        'theta': round(theta, 2),
+        'angle_XH_Pi': round(xh_pi_angle, 2),
+        'angle_XPCN': round(xpcn_angle, 2),
+        'proj_dist': round(proj_dist, 3) if proj_dist is not None else None,
+    }
@@ -4,90 +4,153 @@ Geometric calculations for distance, angles, and vector projections.
 """
 import numpy as np
 import gemmi
-from typing import Tuple, Optional, List
+from typing import Dict, Tuple, Optional, List, Sequence
+from . import _geom_numba
+from . import _geom_scalar
 
 def get_pi_info(atoms: List[gemmi.Atom]) -> Tuple[gemmi.Position, np.ndarray, np.ndarray, float]:
     """
-    Calculates Pi-system center, normal vector (via SVD), and mean B-factor.
+    Calculates Pi-system center, normal vector (least-squares plane fit), and mean B-factor.
     """
-    positions = np.array([atom.pos.tolist() for atom in atoms])
-    
-    # 1. Geometric Center
-    center_array = np.mean(positions, axis=0)
-    pi_center = gemmi.Position(*center_array)
-    
-    # 2. Mean B-factor
-    b_mean = sum(atom.b_iso for atom in atoms) / len(atoms)
-    
-    # 3. Normal Vector (SVD Fitting)
-    centered_pos = positions - center_array
-    _, _, vh = np.linalg.svd(centered_pos)
-    normal_vector = vh[2, :] # The vector corresponding to the smallest singular value
+    positions = [(p.x, p.y, p.z) for p in (atom.pos for atom in atoms)]
+    b_factors = [atom.b_iso for atom in atoms]
+    return get_pi_info_batch([positions], [b_factors])[0]
+
+def get_pi_info_batch(ring_positions: List[Sequence], 
+                      ring_b_factors: List[Sequence]) -> List[Tuple[gemmi.Position, np.ndarray, np.ndarray, float]]:
+    """
+    get_pi_info for many rings at once.
+    Rings ((k, 3) positions and (k,) B-factors, as arrays or nested sequences) are grouped
+    by atom count; each group is converted to one array and fitted with one stacked eigh call.
+    """
+    infos = [None] * len(ring_positions)
+    by_size: Dict[int, List[int]] = {}
+    for k, positions in enumerate(ring_positions):
+        by_size.setdefault(len(positions), []).append(k)
     
-    return pi_center, center_array, normal_vector, b_mean
+    for idx in by_size.values():
+        positions = np.array([ring_positions[k] for k in idx], dtype=np.float64) # (R, N, 3)
+        b_factors = np.array([ring_b_factors[k] for k in idx], dtype=np.float64) # (R, N)
+        
+        # 1. Geometric Centers
+        centers = positions.mean(axis=1)
+        
+        # 2. Mean B-factors
+        b_means = b_factors.sum(axis=1) / b_factors.shape[1]
+        
+        # 3. Normal Vectors: eigenvector of the smallest eigenvalue of the 3x3 scatter
+        # matrix (the plane fit of an SVD, without decomposing the N x 3 coordinates).
+        # Its sign is arbitrary; every metric using the normal is sign-invariant.
+        centered = positions - centers[:, None, :]
+        scatter = np.einsum('rni,rnj->rij', centered, centered)
+        _, eigvecs = np.linalg.eigh(scatter) # Eigenvalues in ascending order
+        normals = eigvecs[:, :, 0]
+        # Unit length is an invariant every geometry kernel relies on; enforce it once here
+        normals = normals / np.sqrt((normals * normals).sum(axis=1))[:, None]
+        
+        for k, center, normal, b_mean in zip(idx, centers, normals, b_means.tolist()):
+            infos[k] = (gemmi.Position(*center), center, normal, b_mean)
+    return infos
+
+# Single-vector metrics use _geom_scalar's math (unpacked scalars, no ndarray overhead);
+# inputs may be arrays, tuples or lists of 3 floats.
 
 def calculate_distance(pos1_array: np.ndarray, pos2_array: np.ndarray) -> float:
-    return np.linalg.norm(pos1_array - pos2_array)
+    # Scalar path only for single 3-vectors; an array with 3 rows goes to NumPy
+    if np.ndim(pos1_array) == 1 and np.ndim(pos2_array) == 1 and len(pos1_array) == 3 and len(pos2_array) == 3:
+        return _geom_scalar.distance(pos1_array, pos2_array)
+    return np.linalg.norm(np.asarray(pos1_array) - np.asarray(pos2_array))
 
 def calculate_xpcn_angle(x_pos: np.ndarray, pi_center: np.ndarray, pi_normal: np.ndarray) -> Optional[float]:
-    """Plevin: Angle between X-PiCenter vector and Normal vector."""
-    v_x_pi = pi_center - x_pos
-    norm_v = np.linalg.norm(v_x_pi)
-    norm_n = np.linalg.norm(pi_normal)
-    
-    if norm_v == 0 or norm_n == 0: return None
-
-    dot_product = np.dot(v_x_pi, pi_normal)
-    cos_theta = np.clip(dot_product / (norm_v * norm_n), -1.0, 1.0)
-    angle = np.degrees(np.arccos(cos_theta))
-    
-    if angle > 90:
-        angle = 180 - angle
-    return angle
+    """Plevin: Angle between X-PiCenter vector and (unit) Normal vector."""
+    return _geom_scalar.xpcn_angle(x_pos, pi_center, pi_normal)
 
 def calculate_xh_picenter_angle(pi_center: np.ndarray, x_pos: np.ndarray, h_pos: np.ndarray) -> Optional[float]:
     """Plevin: Angle between X-H vector and H-PiCenter vector."""
-    v_hx = x_pos - h_pos
-    v_hc = pi_center - h_pos 
-    
-    norm_hx = np.linalg.norm(v_hx)
-    norm_hc = np.linalg.norm(v_hc)
-    
-    if norm_hx == 0 or norm_hc == 0: return None
-    
-    cos_theta = np.clip(np.dot(v_hx, v_hc) / (norm_hx * norm_hc), -1.0, 1.0)
-    return np.degrees(np.arccos(cos_theta))
+    return _geom_scalar.xh_picenter_angle(pi_center, x_pos, h_pos)
 
 def calculate_hudson_theta(pi_center: np.ndarray, x_pos: np.ndarray, h_pos: np.ndarray, normal: np.ndarray) -> Optional[float]:
-    """Hudson: Angle between X-H vector and Normal vector (checking projection direction)."""
-    v_x_pi = pi_center - x_pos
-    v_xh = h_pos - x_pos
+    """Hudson: Angle between X-H vector and (unit) Normal vector (checking projection direction)."""
+    return _geom_scalar.hudson_theta(pi_center, x_pos, h_pos, normal)
+
+def calculate_projection_dist(normal: np.ndarray, pi_center: np.ndarray, x_pos: np.ndarray) -> Optional[float]:
+    """Hudson: Distance from the Pi center to the projection of X onto the plane (unit normal)."""
+    return _geom_scalar.projection_dist(normal, pi_center, x_pos)
+
+# --- Fused Kernel ---
+
+def calculate_interaction_geometry(pi_center: np.ndarray, pi_normal: np.ndarray,
+                                   x_pos: np.ndarray, h_pos: np.ndarray) -> Tuple[Optional[float], ...]:
+    """
+    Fused equivalent of calculate_xpcn_angle, calculate_xh_picenter_angle,
+    calculate_hudson_theta and calculate_projection_dist.
+    Inputs must be contiguous float64 arrays and pi_normal of unit length (as returned
+    by get_pi_info); JIT-compiled when numba is installed.
+    
+    Returns:
+        (xpcn_angle, xh_pi_angle, theta, proj_dist), with None for undefined values.
+    """
+    return tuple(None if v < 0.0 else v for v in _geom_numba.interaction_geometry(pi_center, pi_normal, x_pos, h_pos))
+
+def _angle_deg(cos_values: np.ndarray) -> np.ndarray:
+    return np.degrees(np.arccos(np.clip(cos_values, -1.0, 1.0)))
+
+# Below this many candidates, thread start-up costs more than the parallel loop saves
+PARALLEL_MIN_PAIRS = 4096
+
+def calculate_interaction_geometry_batch(pi_centers: np.ndarray, pi_normals: np.ndarray,
+                                         x_pos: np.ndarray, h_pos: np.ndarray,
+                                         parallel: bool = False) -> Tuple[np.ndarray, ...]:
+    """
+    Batched calculate_interaction_geometry over M (ring, X, H) candidates,
+    each input given as an (M, 3) array (normals of unit length).
+    With numba, the fused kernel runs over all candidates in one compiled loop, spread
+    across CPU cores when parallel is set (leave it off when called concurrently).
+    
+    Returns:
+        (xpcn_angle, xh_pi_angle, theta, proj_dist) as (M,) arrays, NaN where undefined.
+    """
+    if not _geom_numba.HAS_NUMBA:
+        return _interaction_geometry_batch_numpy(pi_centers, pi_normals, x_pos, h_pos)
     
-    norm_xpi = np.linalg.norm(v_x_pi)
-    if norm_xpi == 0: return None
+    kernel = _geom_numba.interaction_geometry_pairs
+    if parallel and len(x_pos) >= PARALLEL_MIN_PAIRS:
+        kernel = _geom_numba.interaction_geometry_pairs_parallel
+    out = kernel(*(np.ascontiguousarray(a, dtype=np.float64) for a in (pi_centers, pi_normals, x_pos, h_pos)))
+    out[out < 0.0] = np.nan
+    return out[:, 0], out[:, 1], out[:, 2], out[:, 3]
 
-    # Projection check: H must point towards the ring
-    proj_len = np.dot(v_xh, v_x_pi) / norm_xpi
+def _interaction_geometry_batch_numpy(pi_centers: np.ndarray, pi_normals: np.ndarray,
+                                      x_pos: np.ndarray, h_pos: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """NumPy column-wise calculate_interaction_geometry_batch, used without numba."""
+    cx, cy, cz = pi_centers[:, 0], pi_centers[:, 1], pi_centers[:, 2]
+    nx, ny, nz = pi_normals[:, 0], pi_normals[:, 1], pi_normals[:, 2]
+    xx, xy, xz = x_pos[:, 0], x_pos[:, 1], x_pos[:, 2]
+    hx, hy, hz = h_pos[:, 0], h_pos[:, 1], h_pos[:, 2]
     
-    if proj_len > 0:
-        norm_n = np.linalg.norm(normal)
-        norm_xh = np.linalg.norm(v_xh)
-        if norm_n == 0 or norm_xh == 0: return None
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # X -> PiCenter; ratios use |dot| / sqrt(a2 * b2): one sqrt and one divide each
+        vx, vy, vz = cx - xx, cy - xy, cz - xz
+        v2 = vx * vx + vy * vy + vz * vz
+        vn = vx * nx + vy * ny + vz * nz
+        # |cos| gives the acute angle directly (no flip above 90 degrees)
+        xpcn = _angle_deg(np.abs(vn) / np.sqrt(v2))
+        xpcn[v2 == 0.0] = np.nan
         
-        cos_angle = np.clip(np.dot(normal, v_xh) / (norm_n * norm_xh), -1.0, 1.0)
-        angle = np.degrees(np.arccos(cos_angle))
+        # H -> X and H -> PiCenter
+        hxx, hxy, hxz = xx - hx, xy - hy, xz - hz
+        hcx, hcy, hcz = cx - hx, cy - hy, cz - hz
+        hx2 = hxx * hxx + hxy * hxy + hxz * hxz
+        hc2 = hcx * hcx + hcy * hcy + hcz * hcz
+        xh_pi = _angle_deg((hxx * hcx + hxy * hcy + hxz * hcz) / np.sqrt(hx2 * hc2))
+        xh_pi[(hx2 == 0.0) | (hc2 == 0.0)] = np.nan
         
-        if angle >= 90:
-            angle = 180 - angle
-        return angle
-    return None
-
-def calculate_projection_dist(normal: np.ndarray, pi_center: np.ndarray, x_pos: np.ndarray) -> Optional[float]:
-    """Hudson: Distance from the Pi center to the projection of X onto the plane."""
-    numerator = np.dot(normal, pi_center - x_pos)
-    denominator = np.dot(normal, normal)
-    if denominator == 0: return None
+        # Hudson theta (X -> H must point towards the ring: positive projection on X -> PiCenter)
+        points_to_ring = -(hxx * vx + hxy * vy + hxz * vz) > 0.0
+        theta = _angle_deg(np.abs(nx * hxx + ny * hxy + nz * hxz) / np.sqrt(hx2))
+        theta[~((v2 != 0.0) & points_to_ring & (hx2 != 0.0))] = np.nan
+        
+        # Projection of X onto the ring plane: in-plane part of X -> PiCenter (Pythagoras)
+        proj = np.sqrt(np.maximum(v2 - vn * vn, 0.0))
     
-    t = numerator / denominator
-    projection_point = x_pos + t * normal
-    return np.linalg.norm(projection_point - pi_center)
\ No newline at end of file
+    return xpcn, xh_pi, theta, proj
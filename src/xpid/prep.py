@@ -13,6 +13,16 @@ logger = logging.getLogger("xpid.prep")
 # Process-level cache for Monomer Library
 _CACHED_MONLIB: Optional[gemmi.MonLib] = None
 _CACHED_LIB_PATH: Optional[str] = None
+# Residue codes already requested from the library (found or not), per process
+_REQUESTED_CODES: Set[str] = set()
+
+# structure.info key recording the h_change mode already applied to a structure
+# (gemmi.Structure takes no new attributes; info entries survive clone())
+PREPARED_INFO_KEY = '_xpid.h_change'
+
+# Preloaded by init_worker: standard amino acids and nucleotides
+STANDARD_CODES = ('ALA ARG ASN ASP CYS GLN GLU GLY HIS ILE LEU LYS MET PHE PRO SER THR TRP TYR VAL '
+                  'DA DC DG DT DU A C G T U').split()
 
 def _get_shared_monlib(mon_lib_path: Optional[str]) -> gemmi.MonLib:
     """Retrieves or initializes the cached Monomer Library."""
@@ -22,45 +32,62 @@ def _get_shared_monlib(mon_lib_path: Optional[str]) -> gemmi.MonLib:
         monlib = gemmi.MonLib()
         _CACHED_MONLIB = monlib
         _CACHED_LIB_PATH = mon_lib_path
+        _REQUESTED_CODES.clear()
         
     return _CACHED_MONLIB
 
+def _load_codes(monlib: gemmi.MonLib, mon_lib_path: Optional[str], codes) -> None:
+    """Reads monomers not requested before in this process (codes missing from the library are not retried)."""
+    new_codes = [code for code in codes if code not in _REQUESTED_CODES and code not in monlib.monomers]
+    if not new_codes:
+        return
+    _REQUESTED_CODES.update(new_codes)
+    
+    if mon_lib_path and os.path.exists(mon_lib_path):
+        try:
+            monlib.read_monomer_lib(mon_lib_path, new_codes)
+        except Exception as e:
+            logger.warning(f"Error reading monomers from lib: {e}")
+
+def init_worker(mon_lib_path: Optional[str]) -> None:
+    """
+    Process-pool initializer: creates the worker's Monomer Library and preloads
+    the standard residues once, so only unusual codes are read per structure.
+    """
+    monlib = _get_shared_monlib(mon_lib_path)
+    _load_codes(monlib, mon_lib_path, STANDARD_CODES)
+
 def add_hydrogens_memory(structure: gemmi.Structure, 
                          mon_lib_path: Optional[str] = None, 
                          h_change_val: int = config.DEFAULT_H_CHANGE) -> Optional[gemmi.Structure]:
     """
     Adds hydrogens to the structure in-memory using Gemmi topology.
-    Skips processing if h_change_val is 0 (e.g., for Neutron structures).
+    Skips processing if h_change_val is 0 (e.g., for Neutron structures), or if the
+    structure was already prepared here with the same mode.
     """
+    # Mode 0: Return original structure (safe for Neutron data)
+    if h_change_val == 0:
+        return structure
+    
+    if PREPARED_INFO_KEY in structure.info and structure.info[PREPARED_INFO_KEY] == str(h_change_val):
+        return structure
+    
     try:
-        # Mode 0: Return original structure (safe for Neutron data)
-        if h_change_val == 0:
+        # Mode 2 (Remove) needs no topology: drop H/D from the model prepare_topology would use
+        if h_change_val == config.H_CHANGE_REMOVE:
+            structure[0].remove_hydrogens()
+            structure.info[PREPARED_INFO_KEY] = str(h_change_val)
             return structure
-
-        # 1. Identify used residues
-        all_codes = set()
-        for model in structure:
-            for chain in model:
-                for residue in chain:
-                    if residue.name.strip():
-                        all_codes.add(residue.name)
         
-        codes_to_load = list(all_codes)
-
-        # 2. Get MonLib (Cached)
+        # 1. Get MonLib (Cached)
         monlib = _get_shared_monlib(mon_lib_path)
         
-        # 3. Incrementally load missing monomers
-        missing_codes = [code for code in codes_to_load if code not in monlib.monomers]
+        # 2. Identify used residues
+        all_codes = {residue.name for model in structure for chain in model
+                     for residue in chain if residue.name.strip()}
         
-        if missing_codes:
-            if mon_lib_path and os.path.exists(mon_lib_path):
-                try:
-                    monlib.read_monomer_lib(mon_lib_path, missing_codes)
-                except Exception as e:
-                    logger.warning(f"Error reading monomers from lib: {e}")
-            else:
-                pass
+        # 3. Incrementally load missing monomers
+        _load_codes(monlib, mon_lib_path, all_codes)
 
         # 4. Prepare Topology
         gemmi.prepare_topology(
@@ -71,6 +98,7 @@ def add_hydrogens_memory(structure: gemmi.Structure,
             reorder=False, 
             ignore_unknown_links=True 
         )
+        structure.info[PREPARED_INFO_KEY] = str(h_change_val)
         
         return structure
 
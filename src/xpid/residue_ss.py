@@ -4,9 +4,10 @@ Secondary structure detection and indexing.
 Encapsulates logic to map residues to secondary structure types and unique region IDs.
 """
 import gemmi
-from typing import Dict, List, Tuple
+import numpy as np
+from typing import Any, Dict, List, Tuple
 
-def build_index(structure: gemmi.Structure) -> Dict[str, List[Tuple[int, int, str, int]]]:
+def build_index(structure: gemmi.Structure) -> Dict[str, Dict[str, np.ndarray]]:
     """
     Builds an index of secondary structures with unique region IDs.
     
@@ -14,9 +15,14 @@ def build_index(structure: gemmi.Structure) -> Dict[str, List[Tuple[int, int, st
     - Helices: Classified into G (3_10), I (Pi), H (Alpha/Others).
     - Sheets: Classified as E (Extended).
     - UIDs: A unique integer ID is assigned to each distinct SS element.
+    - Lookup: Per chain, dense arrays indexed by (seq num - offset) hold the type and UID
+      of every residue number in the annotated span (where ranges overlap, the first
+      one annotated wins), so a query is a single array load.
+    - Types are stored as character codes (ord), so every array is primitive and can be
+      passed as-is to numba nopython code; get_info decodes them.
     
     Returns: 
-        { 'ChainName': [ (StartSeqNum, EndSeqNum, 'TypeChar', RegionUID), ... ] }
+        { 'ChainName': {'offset': int, 'type': uint8[span], 'uid': int64[span]} }
     """
     ss_index = {}
     region_uid_counter = 1
@@ -63,7 +69,24 @@ def build_index(structure: gemmi.Structure) -> Dict[str, List[Tuple[int, int, st
                 except Exception:
                     continue
 
-    return ss_index
+    return {chain: _to_dense(ranges) for chain, ranges in ss_index.items()}
+
+def _to_dense(ranges: List[Tuple[int, int, str, int]]) -> Dict[str, Any]:
+    """
+    Paints (possibly overlapping) ranges into per-residue-number arrays.
+    Ranges are painted last to first so the first range covering a residue wins.
+    """
+    offset = min(start for start, _, _, _ in ranges) # Residue numbers may be negative
+    span = max(max(end for _, end, _, _ in ranges) - offset + 1, 0)
+    type_by_res = np.full(span, ord('C'), dtype=np.uint8)
+    uid_by_res = np.full(span, -1, dtype=np.int64)
+    
+    for start_num, end_num, ss_type, uid in reversed(ranges):
+        if start_num <= end_num:
+            type_by_res[start_num - offset:end_num - offset + 1] = ord(ss_type)
+            uid_by_res[start_num - offset:end_num - offset + 1] = uid
+    
+    return {'offset': offset, 'type': type_by_res, 'uid': uid_by_res}
 
 def get_info(chain_name: str, res_seq_num: int, ss_index: Dict) -> Tuple[str, int]:
     """
@@ -73,11 +96,12 @@ def get_info(chain_name: str, res_seq_num: int, ss_index: Dict) -> Tuple[str, in
         (TypeChar, RegionUID). 
         If no structure found (Coil), returns ('C', -1).
     """
-    if chain_name not in ss_index:
+    dense = ss_index.get(chain_name)
+    if dense is None:
         return ('C', -1)
     
-    for start_num, end_num, ss_type, uid in ss_index[chain_name]:
-        if start_num <= res_seq_num <= end_num:
-            return (ss_type, uid)
+    i = res_seq_num - dense['offset']
+    if 0 <= i < len(dense['uid']):
+        return (chr(dense['type'][i]), int(dense['uid'][i]))
             
-    return ('C', -1)
\ No newline at end of file
+    return ('C', -1)
@@ -6,6 +6,8 @@ def test_distance():
     a = np.array([0., 0., 0.])
     b = np.array([3., 4., 0.])
     assert geometry.calculate_distance(a, b) == 5.0
+    # Three rows are not a 3-vector: Frobenius norm of the difference
+    assert geometry.calculate_distance(np.zeros((3, 3)), np.ones((3, 3))) == 3.0
 
 def test_xpcn_angle():
     # X on Z axis, Center at Origin, Normal is Z
@@ -27,4 +29,54 @@ def test_hudson_theta():
     
     # X-H vector: [-1, 0, 0]. Normal: [0, 0, 1]. Dot is 0. Angle 90.
     angle = geometry.calculate_hudson_theta(pi_center, x_pos, h_pos, normal)
-    assert np.isclose(angle, 90.0) # Hudson logic allows <=90 normalization
\ No newline at end of file
+    assert np.isclose(angle, 90.0) # Hudson logic allows <=90 normalization
+
+def test_interaction_geometry_matches_individual():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        pi_center, normal, x_pos = rng.normal(size=(3, 3))
+        normal /= np.linalg.norm(normal)
+        h_pos = x_pos + 0.3 * (pi_center - x_pos) + rng.normal(scale=0.5, size=3)
+        expected = (
+            geometry.calculate_xpcn_angle(x_pos, pi_center, normal),
+            geometry.calculate_xh_picenter_angle(pi_center, x_pos, h_pos),
+            geometry.calculate_hudson_theta(pi_center, x_pos, h_pos, normal),
+            geometry.calculate_projection_dist(normal, pi_center, x_pos),
+        )
+        fused = geometry.calculate_interaction_geometry(pi_center, normal, x_pos, h_pos)
+        for e, f in zip(expected, fused):
+            assert (e is None and f is None) or np.isclose(e, f)
+
+def test_interaction_geometry_batch_matches_fused(monkeypatch):
+    rng = np.random.default_rng(1)
+    pi_centers, normals, x_pos = rng.normal(size=(3, 50, 3))
+    normals /= np.linalg.norm(normals, axis=1)[:, None]
+    h_pos = x_pos + 0.3 * (pi_centers - x_pos) + rng.normal(scale=0.5, size=(50, 3))
+    monkeypatch.setattr(geometry, 'PARALLEL_MIN_PAIRS', 0)
+    batches = [geometry.calculate_interaction_geometry_batch(pi_centers, normals, x_pos, h_pos),
+               geometry.calculate_interaction_geometry_batch(pi_centers, normals, x_pos, h_pos, parallel=True),
+               geometry._interaction_geometry_batch_numpy(pi_centers, normals, x_pos, h_pos)]
+    for m in range(50):
+        fused = geometry.calculate_interaction_geometry(pi_centers[m], normals[m], x_pos[m], h_pos[m])
+        for batch in batches:
+            for b, f in zip(batch, fused):
+                assert (np.isnan(b[m]) and f is None) or np.isclose(b[m], f)
+
+def test_pi_info_batch_mixed_ring_sizes_keep_order():
+    rng = np.random.default_rng(2)
+    rings = [rng.normal(size=(n, 3)) * [1.0, 1.0, 0.05] for n in (6, 5, 6, 5, 5, 6)]
+    infos = geometry.get_pi_info_batch(rings, [np.full(len(r), float(len(r))) for r in rings])
+    for ring, (pos, center, normal, b_mean) in zip(rings, infos):
+        _, _, vh = np.linalg.svd(ring - ring.mean(axis=0))
+        assert np.allclose(center, ring.mean(axis=0))
+        assert np.isclose(abs(np.dot(normal, vh[2])), 1.0)
+        assert b_mean == len(ring)
+
+def test_scalar_metrics_accept_tuples():
+    pi_center, normal, x_pos, h_pos = (0., 0., 0.), (0., 0., 1.), (0.5, 0., 3.5), (0.4, 0., 2.5)
+    as_arrays = [np.array(v) for v in (pi_center, normal, x_pos, h_pos)]
+    assert geometry.calculate_distance(x_pos, pi_center) == geometry.calculate_distance(as_arrays[2], as_arrays[0])
+    assert geometry.calculate_xpcn_angle(x_pos, pi_center, normal) == pytest.approx(
+        geometry.calculate_xpcn_angle(as_arrays[2], as_arrays[0], as_arrays[1]))
+    assert geometry.calculate_hudson_theta(pi_center, x_pos, h_pos, normal) == pytest.approx(
+        geometry.calculate_hudson_theta(as_arrays[0], as_arrays[2], as_arrays[3], as_arrays[1]))
@@ -1,5 +1,28 @@
+import csv
+import json
+import math
 import gemmi
-from xpid import core, config
+from xpid import cli, core, config, coords, prep, residue_ss
+
+def _make_structure(residues):
+    """One-model, one-chain Structure; residues are (name, [(atom_name, element, (x, y, z))])."""
+    st = gemmi.Structure()
+    model = gemmi.Model("1")
+    chain = gemmi.Chain("A")
+    for num, (res_name, atoms) in enumerate(residues, 1):
+        res = gemmi.Residue()
+        res.name = res_name
+        res.seqid = gemmi.SeqId(num, ' ')
+        for atom_name, element, xyz in atoms:
+            atom = gemmi.Atom()
+            atom.name = atom_name
+            atom.element = gemmi.Element(element)
+            atom.pos = gemmi.Position(*xyz)
+            res.add_atom(atom)
+        chain.add_residue(res)
+    model.add_chain(chain)
+    st.add_model(model)
+    return st
 
 def test_core_detection_empty():
     st = gemmi.Structure()
@@ -26,4 +49,156 @@ def test_model_selection():
     # Test valid index
     core.detect_interactions_in_structure(st, "test", {}, model_mode=0)
     # Test 'all'
-    core.detect_interactions_in_structure(st, "test", {}, model_mode='all')
\ No newline at end of file
+    core.detect_interactions_in_structure(st, "test", {}, model_mode='all')
+
+def test_model_table_search():
+    st = _make_structure([("GLY", [("CA", "C", xyz)]) for xyz in [(1., 2., 3.), (4., 5., 6.)]])
+
+    model = st[0]
+    ns = gemmi.NeighborSearch(model, st.cell, 5).populate()
+    table = coords.ModelTable(model)
+    marks, xyz, elem_z = table.search(ns, gemmi.Position(4., 5., 6.), '\0', 1.0)
+    assert len(marks) == 1 and xyz.tolist() == [[4., 5., 6.]] and elem_z.tolist() == [6]
+
+
+def test_incomplete_ring_skips_pi_info(monkeypatch):
+    # CZ missing: the ring is incomplete
+    st = _make_structure([("PHE", [(name, "C", (float(i), 0., 0.))
+                                   for i, name in enumerate(['CG', 'CD1', 'CD2', 'CE1', 'CE2'])])])
+
+    def fail(ring_positions, ring_b_factors):
+        raise AssertionError("get_pi_info_batch called for an incomplete ring")
+    monkeypatch.setattr(core.geometry, "get_pi_info_batch", fail)
+    assert core.detect_interactions_in_structure(st, "test") == []
+
+
+def _ring(center_x, radius, names, angles):
+    """Planar ring atoms at z = 0 on a circle around (center_x, 0, 0); angles in degrees."""
+    return [(name, "N" if name.startswith("N") else "C",
+             (center_x + radius * math.cos(math.radians(a)), radius * math.sin(math.radians(a)), 0.))
+            for name, a in zip(names, angles)]
+
+def test_phe_ring_with_ch_donor_above():
+    # Hexagonal PHE ring around the origin; CA-HA2 points down at the ring from above
+    phe = _ring(0., 1.39, ['CG', 'CD1', 'CE1', 'CZ', 'CE2', 'CD2'], range(0, 360, 60))
+    st = _make_structure([("PHE", phe),
+                          ("GLY", [("CA", "C", (0.5, 0., 3.5)), ("HA2", "H", (0.45, 0., 2.45))])])
+    
+    res = core.detect_interactions_in_structure(st, "test")
+    assert len(res) == 1
+    rec = res[0]
+    assert (rec['pi_res'], rec['X_res'], rec['X_atom'], rec['H_atom']) == ("PHE", "GLY", "CA", "HA2")
+    assert rec['is_plevin'] == 1 and rec['is_hudson'] == 1
+    assert rec['dist_X_Pi'] == round(math.hypot(0.5, 3.5), 3)
+    # X-H = (-0.05, 0, -1.05) against the z normal; X projects 0.5 A from the center
+    assert rec['theta'] == round(math.degrees(math.atan2(0.05, 1.05)), 2)
+    assert rec['proj_dist'] == 0.5
+
+def test_donor_shared_by_both_trp_rings(monkeypatch):
+    # 6- and 5-ring fused along CD2-CE2 (the y axis); CA sits above the shared bond
+    six = _ring(1.39 * math.cos(math.radians(30)), 1.39,
+                ['CD2', 'CE2', 'CE3', 'CZ3', 'CH2', 'CZ2'], [150, 210, 270, 330, 30, 90])
+    five = _ring(-0.695 / math.tan(math.radians(36)), 0.695 / math.sin(math.radians(36)),
+                 ['CG', 'CD1', 'NE1'], [108, 180, 252])
+    st = _make_structure([("TRP", six + five),
+                          ("GLY", [("CA", "C", (0., 0., 3.)), ("HA2", "H", (0., 0., 2.))])])
+    
+    resolved = []
+    resolve = core._resolve_donor
+    def counting(model, ns, table, x_mark, filter_donor):
+        resolved.append((x_mark.chain_idx, x_mark.residue_idx, x_mark.atom_idx))
+        return resolve(model, ns, table, x_mark, filter_donor)
+    monkeypatch.setattr(core, "_resolve_donor", counting)
+    
+    res = core.detect_interactions_in_structure(st, "test")
+    assert sorted(rec['remark'] for rec in res) == ["5-ring", "6-ring"]
+    assert all((rec['X_atom'], rec['H_atom'], rec['is_hudson']) == ("CA", "HA2", 1) for rec in res)
+    # CA projects onto the shared bond: each ring's apothem away from its own center
+    proj = {rec['remark']: rec['proj_dist'] for rec in res}
+    assert proj == {"6-ring": round(1.39 * math.cos(math.radians(30)), 3),
+                    "5-ring": round(0.695 / math.tan(math.radians(36)), 3)}
+    # Each candidate X is resolved once per model, whichever ring finds it first
+    assert len(resolved) == len(set(resolved)) and (0, 1, 0) in resolved
+
+
+def test_result_array_round_trip():
+    kinds = {'U': "AB", 'f8': 1.25, 'i8': 7}
+    record = {name: kinds[kind] for name, kind in cli.RESULT_FIELDS}
+    other = dict(record, pdb="longer_name", proj_dist=None)
+
+    arr = cli.records_to_array([record, other])
+    rows = cli._array_rows(arr, arr.dtype.names)
+    assert [dict(zip(arr.dtype.names, row)) for row in rows] == [record, other]
+
+
+def _read_results(path, file_type):
+    text = path.read_text(encoding='utf-8')
+    if file_type == 'json':
+        return json.loads(text)
+    if file_type == 'jsonl':
+        assert text == '' or (text.endswith('\n') and '\n\n' not in text)
+        return [json.loads(line) for line in text.splitlines()]
+    return list(csv.DictReader(text.splitlines()))
+
+def test_result_streamer_round_trip(tmp_path):
+    kinds = {'U': "AB", 'f8': 1.25, 'i8': 7}
+    first = {name: kinds[kind] for name, kind in cli.RESULT_FIELDS}
+    second = dict(first, pdb="longer_name", proj_dist=None)
+    third = dict(first, pdb="\u00e9", proj_dist=0.5)
+
+    for file_type in ('json', 'jsonl', 'csv'):
+        for verbose in (True, False):
+            # Columns are fixed by whichever chunk comes first: a dict list or a result array
+            chunks = [[first], cli.records_to_array([second, third])]
+            path = tmp_path / f"out_{verbose}.{file_type}"
+            with cli.ResultStreamer(path, file_type, verbose) as streamer:
+                for chunk in (chunks if verbose else chunks[::-1]):
+                    streamer.write_chunk(chunk)
+
+            cols = list(first) if verbose else [k for k in cli.SIMPLE_COLS if k in first]
+            records = [first, second, third] if verbose else [second, third, first]
+            expected = [{k: rec[k] for k in cols} for rec in records]
+            if file_type == 'csv':
+                expected = [{k: '' if v is None else str(v) for k, v in rec.items()} for rec in expected]
+            assert _read_results(path, file_type) == expected
+
+        empty = tmp_path / f"empty.{file_type}"
+        with cli.ResultStreamer(empty, file_type, True) as streamer:
+            streamer.write_chunk([])
+        assert _read_results(empty, file_type) == []
+
+
+def test_model_without_hydrogens_is_skipped(monkeypatch):
+    st = _make_structure([("GLY", [("CA", "C", (0., 0., 0.))])])
+
+    def fail(*args):
+        raise AssertionError("NeighborSearch built for a hydrogen-free model")
+    monkeypatch.setattr(core.gemmi, "NeighborSearch", fail)
+    assert core.detect_interactions_in_structure(st, "test") == []
+
+
+def test_ss_lookup_overlapping_ranges():
+    # Helix 5-15 annotated before an overlapping strand 10-20: the helix wins on 10-15
+    index = {'A': residue_ss._to_dense([(5, 15, 'H', 1), (10, 20, 'E', 2)])}
+    assert residue_ss.get_info('A', 4, index) == ('C', -1)
+    assert residue_ss.get_info('A', 12, index) == ('H', 1)
+    assert residue_ss.get_info('A', 18, index) == ('E', 2)
+    assert residue_ss.get_info('B', 12, index) == ('C', -1)
+
+def test_add_hydrogens_skips_prepared_structure(monkeypatch):
+    st = _make_structure([("GLY", [])])
+
+    calls = []
+    monkeypatch.setattr(prep.gemmi, "prepare_topology", lambda st, monlib, **kw: calls.append(kw['h_change']))
+    for h_mode in (4, 4, 1):
+        assert prep.add_hydrogens_memory(st, None, h_change_val=h_mode) is st
+    assert calls == [4, 1]
+
+def test_remove_mode_skips_topology(monkeypatch):
+    st = _make_structure([("GLY", [("CA", "C", (0., 0., 0.)), ("HA2", "H", (0., 1., 0.))])])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("prepare_topology called in Remove mode")
+    monkeypatch.setattr(prep.gemmi, "prepare_topology", fail)
+    assert prep.add_hydrogens_memory(st, None, h_change_val=config.H_CHANGE_REMOVE) is st
+    assert [a.name for a in st[0][0][0]] == ["CA"]